@@ -0,0 +1,192 @@
+"""
+Benchmark for the site-local ingest aggregator.
+Starts a local stand-in for the Supabase upstream (storage, cameras and detections endpoints,
+with optional simulated WAN latency), starts the aggregator against it, then has several
+simulated workers push binary events over keep-alive connections.
+
+Each camera reports the same violation --repeat times in a row (with a different confidence in
+the text each time, as real frames do), so with dedup on only the first of each run is forwarded.
+
+Usage: python bench_aggregator.py [--workers 8] [--events 200] [--repeat 5] [--image-kb 60] [--upstream-latency-ms 30]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from event_log import setup_event_logging
+from ingest_aggregator import CONTENT_TYPE, DEDUP_WINDOW, encode_event, start_aggregator
+
+BENCH_TOKEN = 'bench-token'
+
+
+class StandInUpstream(ThreadingHTTPServer):
+    """Minimal stand-in for the Supabase REST/storage API that counts what it receives."""
+
+    daemon_threads = True
+
+    def __init__(self, latency_s=0.0):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.latency_s = latency_s
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.images = 0
+        self.rows = 0
+        self.bytes_received = 0
+        self.cameras = {}  # zone -> id
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self._count(0)
+        if self.path.startswith('/rest/v1/cameras'):
+            location = parse_qs(urlparse(self.path).query).get('location', [''])[0]
+            camera_id = self.server.cameras.get(location[len('eq.'):])
+            return self._reply(200, [{'id': camera_id}] if camera_id else [])
+        self._reply(404, {})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._count(len(body))
+        if self.path.startswith('/storage/v1/object/'):
+            with self.server.lock:
+                self.server.images += 1
+            return self._reply(200, {'Key': self.path})
+        if self.path == '/rest/v1/cameras':
+            camera = json.loads(body)
+            with self.server.lock:
+                camera_id = self.server.cameras.setdefault(camera['zone'], str(uuid.uuid4()))
+            return self._reply(201, [{'id': camera_id}])
+        if self.path == '/rest/v1/detections':
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            with self.server.lock:
+                self.server.rows += len(json.loads(body))
+            return self._reply(201, None)
+        self._reply(404, {})
+
+    def _count(self, nbytes):
+        time.sleep(self.server.latency_s)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_received += nbytes
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_worker(url, worker_index, events, repeat, image_bytes, duplicate_every, latencies, lock):
+    session = requests.Session()
+    headers = {'Content-Type': CONTENT_TYPE, 'X-Aggregator-Token': BENCH_TOKEN}
+    for i in range(events):
+        confidence = 0.6 + (i % 40) / 100
+        meta = {
+            'event_id': uuid.uuid4().hex,
+            'camera_id': f'bench-camera-{worker_index}-{i // repeat}',  # New camera for each run of repeats
+            'zone': f'Bench Zone {worker_index % 4}',
+            'violation_type': f'Missing Hard Hat (Confidence: {confidence:.1%})',
+            'violation_key': 'NO-Hardhat',
+            'severity': 'high',
+            'confidence': confidence,
+        }
+        body = encode_event(meta, image_bytes)
+        sends = 2 if duplicate_every and i % duplicate_every == 0 else 1  # Simulated retries
+        for _ in range(sends):
+            start = time.perf_counter()
+            session.post(f'{url}/v1/detections', data=body, headers=headers, timeout=10)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--events', type=int, default=200, help='Events per worker')
+    parser.add_argument('--repeat', type=int, default=5, help='Consecutive events per camera with the same violation')
+    parser.add_argument('--dedup-window', type=float, default=DEDUP_WINDOW, help='Seconds (0 = dedup off)')
+    parser.add_argument('--image-kb', type=int, default=60)
+    parser.add_argument('--duplicate-every', type=int, default=10, help='Resend every Nth event (0 = never)')
+    parser.add_argument('--upstream-latency-ms', type=float, default=30)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--gzip', action='store_true', help='gzip bulk inserts to the stand-in upstream')
+    args = parser.parse_args()
+
+    setup_event_logging('WARNING')
+    upstream = StandInUpstream(args.upstream_latency_ms / 1000)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f'http://127.0.0.1:{upstream.server_port}'
+
+    server, aggregator = start_aggregator(upstream_url, 'bench-key', host='127.0.0.1', port=0,
+                                          gzip_rows=args.gzip, token=BENCH_TOKEN, batch_size=args.batch_size,
+                                          dedup_window=args.dedup_window)
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    image_bytes = os.urandom(args.image_kb * 1024)  # JPEG-sized, incompressible payload
+    latencies, lock = [], threading.Lock()
+    start = time.perf_counter()
+    workers = [
+        threading.Thread(target=run_worker, args=(url, w, args.events, args.repeat, image_bytes,
+                                                  args.duplicate_every, latencies, lock))
+        for w in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    ingest_s = time.perf_counter() - start
+
+    while aggregator.stats()['queued']:
+        time.sleep(0.05)
+    drained_s = time.perf_counter() - start
+    server.shutdown()
+    aggregator.stop()
+
+    stats = aggregator.stats()
+    latencies.sort()
+    print("=" * 60)
+    print("📊 Ingest Aggregator Benchmark")
+    print("=" * 60)
+    print(f"Workers: {args.workers} x {args.events} events, {args.image_kb} KB images, "
+          f"upstream latency {args.upstream_latency_ms:.0f} ms, batch size {args.batch_size}")
+    print(f"\nIngest:   {len(latencies)} posts in {ingest_s:.2f}s → {len(latencies) / ingest_s:.0f} events/s")
+    print(f"          latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"Drained:  {drained_s:.2f}s → {stats['forwarded'] / drained_s:.0f} events/s forwarded")
+    runs = args.workers * -(-args.events // args.repeat)
+    expected = runs if args.dedup_window else args.workers * args.events
+    print(f"Dedup:    window {args.dedup_window:g}s, expected {expected} forwarded, got {stats['forwarded']}")
+    print(f"\nAggregator: {json.dumps(stats, indent=2)}")
+    print(f"\nUpstream: {upstream.requests} requests over {upstream.connections} connections, "
+          f"{upstream.rows} rows, {upstream.images} images, {upstream.bytes_received / 1e6:.1f} MB")
+    print(f"          {stats['forwarded'] / max(upstream.requests - upstream.images, 1):.1f} rows per non-image request "
+          f"(direct mode: 1 row + camera lookup per event)")
+
+
+if __name__ == "__main__":
+    main()
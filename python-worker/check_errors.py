@@ -65,18 +65,19 @@ try:
     print("=" * 60)
     print()
     print("When you run: python real_time_monitor.py")
+    print("(output is one JSON event per line)")
     print()
     print("✅ GOOD SIGNS:")
-    print("   - '✅ Model loaded! Classes: ...'")
-    print("   - '✅ Can read from Supabase'")
-    print("   - '✅ Can insert to Supabase'")
-    print("   - '✅ Detection inserted to database! ID: ...'")
+    print("   - '\"event\": \"model_loaded\"' (with the model classes)")
+    print("   - '\"event\": \"supabase_read_ok\"'")
+    print("   - '\"event\": \"supabase_insert_ok\"'")
+    print("   - '\"event\": \"detection_pushed\"' (with detection_id)")
     print()
     print("❌ ERROR SIGNS:")
-    print("   - '❌ Database insert failed: 403' → RLS blocking!")
-    print("   - '❌ Database insert failed: 401' → Authentication error!")
-    print("   - '❌ Cannot insert to detections table' → RLS or permissions!")
-    print("   - '⚠️ Could not create camera' → Camera creation failed!")
+    print("   - 'detection_insert_failed' with \"status\": 403 → RLS blocking!")
+    print("   - 'detection_insert_failed' with \"status\": 401 → Authentication error!")
+    print("   - 'supabase_insert_failed' → RLS or permissions!")
+    print("   - 'camera_create_failed' → Camera creation failed!")
     print()
     print("💡 QUICK FIXES:")
     print("   1. If you see '403' or 'row-level security':")
@@ -91,6 +92,11 @@ try:
     print("      → If rows exist → Frontend issue (check browser console)")
     print("      → If no rows → Python insert is failing (check errors above)")
     print()
+    print("📏 Sizing a host (how many cameras can it handle?):")
+    print("   Run on the target machine: python profile_capacity.py")
+    print("   It measures decode, inference, encode and upload cost and recommends")
+    print("   DETECTION_INTERVAL and the max camera count.")
+    print()
     
 except Exception as e:
     print(f"❌ Error checking file: {e}")
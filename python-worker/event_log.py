@@ -0,0 +1,183 @@
+"""
+Structured JSON-lines event logging for the Python worker.
+Records are handed to a background thread through a bounded queue, so the detection loop
+never waits on stdout or a log collector. Per-frame events are sampled and rate-limited
+per camera before a record is even created.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+LOGGER_NAME = 'ppe_monitor'
+QUEUE_SIZE = 10000  # Records beyond this are dropped (and counted) instead of blocking
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format a record as one JSON object per line."""
+
+    def format(self, record):
+        event = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'event': getattr(record, 'event', record.name),
+        }
+        msg = record.getMessage()
+        if msg:
+            event['msg'] = msg
+        event.update(getattr(record, 'fields', {}))
+        if record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener thread and never blocks.
+
+    Records that don't fit are counted; once the queue has room again a 'log_events_dropped'
+    event reports how many were lost, so gaps in the stream are visible.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0  # Total since start
+        self.unreported = 0  # Dropped since the last log_events_dropped event
+
+    def prepare(self, record):
+        # Tracebacks are rare; render them now since exc_info can't outlive this frame safely.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+            return
+        if self.unreported:
+            try:
+                self.queue.put_nowait(self.dropped_record())
+                self.unreported = 0
+            except queue.Full:
+                pass
+
+    def dropped_record(self):
+        record = logging.LogRecord(LOGGER_NAME, logging.WARNING, __file__, 0,
+                                   'Log queue was full; events were lost', None, None)
+        record.event = 'log_events_dropped'
+        record.fields = {'dropped': self.unreported, 'dropped_total': self.dropped}
+        return record
+
+
+class FrameEventLimiter:
+    """Sample and rate-limit per-frame events, keyed by event name (token bucket per key)."""
+
+    def __init__(self, max_per_second=1.0, sample_rate=1.0):
+        self.max_per_second = max_per_second
+        self.sample_rate = sample_rate
+        self._buckets = {}  # event -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def allow(self, event):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if self.max_per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(event, (1.0, now))
+            tokens = min(1.0, tokens + (now - last) * self.max_per_second)
+            if tokens < 1.0:
+                self._buckets[event] = (tokens, now)
+                return False
+            self._buckets[event] = (tokens - 1.0, now)
+            return True
+
+
+class EventLogger:
+    """Logger bound to per-camera context fields (camera_id, zone, ...)."""
+
+    def __init__(self, logger, context, limiter):
+        self.logger = logger
+        self.context = context
+        self.limiter = limiter
+
+    def bind(self, **context):
+        """Return a logger with extra context fields; shares this logger's frame limiter."""
+        return EventLogger(self.logger, {**self.context, **context}, self.limiter)
+
+    def log(self, level, event, msg='', exc_info=False, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, msg, exc_info=exc_info,
+                        extra={'event': event, 'fields': {**self.context, **fields}})
+
+    def debug(self, event, msg='', **fields):
+        self.log(logging.DEBUG, event, msg, **fields)
+
+    def info(self, event, msg='', **fields):
+        self.log(logging.INFO, event, msg, **fields)
+
+    def warning(self, event, msg='', **fields):
+        self.log(logging.WARNING, event, msg, **fields)
+
+    def error(self, event, msg='', **fields):
+        self.log(logging.ERROR, event, msg, **fields)
+
+    def exception(self, event, msg='', **fields):
+        self.log(logging.ERROR, event, msg, exc_info=True, **fields)
+
+    def allow_frame(self, event):
+        """Cheap check for per-frame events; call before building expensive fields."""
+        return self.logger.isEnabledFor(logging.INFO) and self.limiter.allow(event)
+
+    def frame(self, event, msg='', **fields):
+        """Log a per-frame INFO event, subject to sampling and rate-limiting."""
+        if self.allow_frame(event):
+            self.log(logging.INFO, event, msg, **fields)
+
+
+def setup_event_logging(level='INFO', stream=None):
+    """Route LOGGER_NAME records through a non-blocking queue to a JSON-lines stream.
+
+    Returns the started QueueListener; it is stopped (flushing pending events) at exit, and
+    any still-unreported dropped events are reported then.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonLinesFormatter())
+
+    log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.queue_handler = queue_handler  # Exposes .dropped
+    listener.start()
+
+    def stop():
+        listener.stop()
+        if queue_handler.unreported:
+            output.handle(queue_handler.dropped_record())
+
+    atexit.register(stop)
+    return listener
+
+
+def get_event_logger(frame_events_per_second=1.0, frame_sample_rate=1.0, **context):
+    """Create an EventLogger with the given context fields and per-frame limits."""
+    limiter = FrameEventLimiter(frame_events_per_second, frame_sample_rate)
+    return EventLogger(logging.getLogger(LOGGER_NAME), context, limiter)
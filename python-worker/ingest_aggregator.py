@@ -0,0 +1,535 @@
+"""
+Site-Local Ingest Aggregator
+Workers on the site LAN send binary detection events here (keep-alive HTTP) instead of
+talking to Supabase directly. The aggregator drops duplicates, batches events and forwards
+them upstream over a small pool of connections: images go to storage in parallel, rows are
+inserted with one (optionally gzip-compressed) bulk insert per batch.
+
+Run:    AGGREGATOR_HOST=<site-LAN IP> AGGREGATOR_TOKEN=<secret> python ingest_aggregator.py
+Worker: set INGEST_AGGREGATOR_URL = 'http://<this-host>:8787' and INGEST_AGGREGATOR_TOKEN = <secret>
+Stats:  GET http://<this-host>:8787/stats
+
+Without AGGREGATOR_TOKEN it only accepts connections from this machine (loopback).
+"""
+
+import collections
+import gzip
+import hmac
+import ipaddress
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from event_log import setup_event_logging, get_event_logger
+
+# ===== CONFIGURATION =====
+LISTEN_HOST = os.environ.get('AGGREGATOR_HOST', '127.0.0.1')  # Set to the site-LAN address to serve workers
+LISTEN_PORT = int(os.environ.get('AGGREGATOR_PORT', '8787'))
+AUTH_TOKEN = os.environ.get('AGGREGATOR_TOKEN', '')  # Shared secret workers send as X-Aggregator-Token
+MAX_EVENT_BYTES = 5 * 1024 * 1024  # Larger request bodies are rejected with 413
+REQUEST_TIMEOUT = 30  # Seconds a worker connection may sit idle or stall mid-request
+
+# Upstream (Supabase project, or a local stand-in for benchmarks). Defaults to the monitor's settings.
+UPSTREAM_URL = os.environ.get('AGGREGATOR_UPSTREAM_URL', '')
+UPSTREAM_KEY = os.environ.get('AGGREGATOR_UPSTREAM_KEY', '')
+UPSTREAM_CONNECTIONS = 4  # Max concurrent upstream connections (pooled, keep-alive)
+UPSTREAM_GZIP = os.environ.get('AGGREGATOR_UPSTREAM_GZIP', '0') == '1'  # Enable if upstream accepts gzip bodies
+UPSTREAM_TIMEOUT = 15
+
+# Batching
+BATCH_SIZE = 50  # Forward as soon as this many events are pending...
+BATCH_MAX_WAIT = 2.0  # ...or when the oldest pending event is this many seconds old
+MAX_QUEUE = 2000  # Pending events beyond this are rejected with 503 (workers fall back to direct)
+MAX_ATTEMPTS = 5  # Upstream attempts per event before it is dropped
+MAX_RETRY_DELAY = 30  # Seconds; cap for the exponential retry/back-off delay
+
+# Deduplication
+DEDUP_WINDOW = 10.0  # Seconds; same camera + violation labels within the window is a duplicate (0 = off)
+SEEN_IDS_LIMIT = 10000  # Event IDs remembered for retry deduplication
+
+STATS_LOG_INTERVAL = 60  # Seconds between 'aggregator_stats' log events
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/640x480?text=Detection+Image"
+
+CONTENT_TYPE = 'application/x-ppe-event'
+_HEADER = struct.Struct('>I')  # Length of the JSON metadata that precedes the JPEG bytes
+
+log = get_event_logger(component='aggregator')
+
+
+# ===== WIRE FORMAT =====
+
+def encode_event(meta, jpeg_bytes):
+    """Encode one detection event: 4-byte metadata length, JSON metadata, then raw JPEG bytes."""
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode()
+    return _HEADER.pack(len(meta_bytes)) + meta_bytes + jpeg_bytes
+
+
+def decode_event(body):
+    """Inverse of encode_event. Returns (meta, jpeg_bytes); raises ValueError if malformed."""
+    if len(body) < _HEADER.size:
+        raise ValueError('event too short')
+    (meta_len,) = _HEADER.unpack_from(body)
+    meta_end = _HEADER.size + meta_len
+    if meta_end > len(body):
+        raise ValueError('metadata length exceeds body')
+    meta = json.loads(body[_HEADER.size:meta_end])
+    if not isinstance(meta, dict) or not meta.get('violation_type'):
+        raise ValueError('metadata must include violation_type')
+    return meta, body[meta_end:]
+
+
+# ===== UPSTREAM =====
+
+class UpstreamClient:
+    """Supabase REST/storage client sharing a small pool of keep-alive connections."""
+
+    def __init__(self, base_url, api_key, connections=UPSTREAM_CONNECTIONS, gzip_rows=UPSTREAM_GZIP):
+        self.base_url = base_url.rstrip('/')
+        self.connections = connections
+        self.gzip_rows = gzip_rows
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'apikey': api_key, 'Authorization': f'Bearer {api_key}'})
+        self.bytes_sent = 0
+        self._camera_ids = {}  # zone -> camera UUID
+        self._lock = threading.Lock()
+
+    def upload_image(self, jpeg_bytes):
+        """Upload one image to storage. Returns the public URL, or None on failure."""
+        filename = f"detections/{uuid.uuid4()}.jpg"
+        try:
+            response = self.session.post(
+                f"{self.base_url}/storage/v1/object/detection-images/{filename}",
+                data=jpeg_bytes,
+                headers={'Content-Type': 'image/jpeg', 'x-upsert': 'true'},
+                timeout=UPSTREAM_TIMEOUT,
+            )
+        except requests.exceptions.RequestException as e:
+            log.warning('upstream_image_failed', str(e))
+            return None
+        self._count(len(jpeg_bytes))
+        if response.status_code not in [200, 201]:
+            log.warning('upstream_image_failed', response.text[:200], status=response.status_code)
+            return None
+        return f"{self.base_url}/storage/v1/object/public/detection-images/{filename}"
+
+    def camera_id(self, zone):
+        """Resolve (creating if needed) the camera for a zone; cached for the process lifetime."""
+        with self._lock:
+            if zone in self._camera_ids:
+                return self._camera_ids[zone]
+        try:
+            response = self.session.get(
+                f"{self.base_url}/rest/v1/cameras",
+                params={'select': 'id', 'name': f'eq.Camera {zone}', 'location': f'eq.{zone}'},
+                timeout=UPSTREAM_TIMEOUT,
+            )
+            cameras = response.json() if response.status_code == 200 else []
+            if not cameras:
+                response = self.session.post(
+                    f"{self.base_url}/rest/v1/cameras",
+                    json={'name': f'Camera {zone}', 'location': zone, 'status': 'active', 'zone': zone},
+                    headers={'Prefer': 'return=representation'},
+                    timeout=UPSTREAM_TIMEOUT,
+                )
+                cameras = response.json() if response.status_code in [200, 201] else []
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning('upstream_camera_failed', str(e), zone=zone)
+            return None
+        if not cameras:
+            log.warning('upstream_camera_failed', 'No camera ID returned', zone=zone)
+            return None
+        with self._lock:
+            self._camera_ids[zone] = cameras[0]['id']
+        return cameras[0]['id']
+
+    def insert_detections(self, rows):
+        """Insert all rows with one bulk request.
+
+        Returns 'inserted', 'retry' (network error, 5xx, 408/429) or 'rejected' (any other 4xx:
+        RLS, auth or a bad row - sending the same rows again won't help).
+        """
+        body = json.dumps(rows, separators=(',', ':')).encode()
+        headers = {'Content-Type': 'application/json', 'Prefer': 'return=minimal'}
+        if self.gzip_rows:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        try:
+            response = self.session.post(f"{self.base_url}/rest/v1/detections", data=body,
+                                         headers=headers, timeout=UPSTREAM_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            log.warning('upstream_insert_failed', str(e), rows=len(rows))
+            return 'retry'
+        self._count(len(body))
+        if response.status_code in [200, 201, 204]:
+            return 'inserted'
+        if 400 <= response.status_code < 500 and response.status_code not in [408, 429]:
+            log.error('upstream_insert_rejected', response.text[:500], status=response.status_code,
+                      rows=[{'camera_id': row['camera_id'], 'violation_type': row['violation_type'],
+                             'detected_at': row['detected_at']} for row in rows])
+            return 'rejected'
+        log.warning('upstream_insert_failed', response.text[:200], status=response.status_code, rows=len(rows))
+        return 'retry'
+
+    def _count(self, nbytes):
+        with self._lock:
+            self.bytes_sent += nbytes
+
+
+# ===== AGGREGATOR =====
+
+class Aggregator:
+    """Deduplicating event queue with a background forwarder that ships batches upstream.
+
+    When a whole batch fails (uplink down), it goes back to the front of the queue and the
+    forwarder backs off. Events that fail on their own (image upload, camera lookup) wait
+    in a separate retry list with per-event back-off, so they don't hold up the rest.
+    """
+
+    def __init__(self, upstream, batch_size=BATCH_SIZE, batch_max_wait=BATCH_MAX_WAIT,
+                 max_queue=MAX_QUEUE, dedup_window=DEDUP_WINDOW):
+        self.upstream = upstream
+        self.batch_size = batch_size
+        self.batch_max_wait = batch_max_wait
+        self.max_queue = max_queue
+        self.dedup_window = dedup_window
+        self.started_at = time.time()
+        self.counters = collections.Counter()
+        self._pending = collections.deque()
+        self._retrying = []  # Events that failed individually, each with a 'due_at' time
+        self._seen_ids = collections.OrderedDict()
+        self._last_by_key = {}  # (camera_id, zone, violation_key) -> last accepted time
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=upstream.connections, thread_name_prefix='upstream')
+        self._forwarder = threading.Thread(target=self._forward_loop, name='forwarder', daemon=True)
+
+    def start(self):
+        self._forwarder.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Stop accepting work, flush what is pending and wait for the forwarder."""
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._forwarder.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def submit(self, meta, jpeg_bytes, nbytes):
+        """Queue one event. Returns 'queued', 'duplicate' or 'full'."""
+        now = time.time()
+        event_id = meta.get('event_id')
+        # violation_key holds the class labels (stable across frames); violation_type includes confidence
+        key = (meta.get('camera_id'), meta.get('zone'), meta.get('violation_key') or meta['violation_type'])
+        with self._cond:
+            self.counters['received'] += 1
+            self.counters['bytes_in'] += nbytes
+            if event_id and event_id in self._seen_ids:
+                self.counters['duplicates'] += 1
+                return 'duplicate'
+            if self.dedup_window and now - self._last_by_key.get(key, 0) < self.dedup_window:
+                self.counters['duplicates'] += 1
+                return 'duplicate'
+            if len(self._pending) + len(self._retrying) >= self.max_queue:
+                self.counters['rejected'] += 1
+                return 'full'
+            if event_id:
+                self._seen_ids[event_id] = None
+                if len(self._seen_ids) > SEEN_IDS_LIMIT:
+                    self._seen_ids.popitem(last=False)
+            self._last_by_key[key] = now
+            self._pending.append({'meta': meta, 'image': jpeg_bytes, 'image_url': None,
+                                  'received_at': now, 'due_at': now + self.batch_max_wait, 'attempts': 0})
+            # Wake the forwarder on a full batch, or so it re-times its wait (it may be sleeping on a retry back-off)
+            if len(self._pending) >= self.batch_size or len(self._pending) == 1:
+                self._cond.notify()
+        return 'queued'
+
+    def stats(self):
+        with self._cond:
+            counters = dict(self.counters)
+            queued = len(self._pending) + len(self._retrying)
+        uptime = max(time.time() - self.started_at, 1e-9)
+        batches = counters.get('batches', 0)
+        return {
+            'uptime_s': round(uptime, 1),
+            'queued': queued,
+            'received': counters.get('received', 0),
+            'duplicates': counters.get('duplicates', 0),
+            'rejected': counters.get('rejected', 0),
+            'forwarded': counters.get('forwarded', 0),
+            'retried': counters.get('retried', 0),
+            'dropped': counters.get('dropped', 0),
+            'batches': batches,
+            'avg_batch_size': round(counters.get('forwarded', 0) / batches, 1) if batches else 0,
+            'received_per_s': round(counters.get('received', 0) / uptime, 2),
+            'forwarded_per_s': round(counters.get('forwarded', 0) / uptime, 2),
+            'bytes_in': counters.get('bytes_in', 0),
+            'bytes_upstream': self.upstream.bytes_sent,
+        }
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                self._release_due_retries()
+                if len(self._pending) >= self.batch_size or (self._pending and self._stopping.is_set()):
+                    break
+                due_at = min([e['due_at'] for e in self._retrying] +
+                             ([self._pending[0]['due_at']] if self._pending else []), default=None)
+                if due_at is not None:
+                    wait_s = due_at - time.time()
+                    if wait_s <= 0 and self._pending:
+                        break
+                    self._cond.wait(max(wait_s, 0.01))
+                elif self._stopping.is_set():
+                    return []
+                else:
+                    self._cond.wait(1.0)
+            return [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+    def _release_due_retries(self):
+        """Move retry events whose back-off has passed (all of them when stopping) to the queue."""
+        if not self._retrying:
+            return
+        now = time.time()
+        stopping = self._stopping.is_set()
+        due = [e for e in self._retrying if stopping or e['due_at'] <= now]
+        if due:
+            self._retrying = [e for e in self._retrying if not (stopping or e['due_at'] <= now)]
+            self._pending.extend(due)
+
+    def _forward_loop(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                failed, retry_later = self._forward(batch)
+            except Exception:
+                log.exception('forward_failed', events=len(batch))
+                failed, retry_later = batch, []
+            if retry_later:
+                self._requeue(retry_later, later=True)
+            if failed:
+                self._requeue(failed)
+                # Back off so a dead uplink isn't hammered; stop() cuts the wait short.
+                self._stopping.wait(min(2 ** max(e['attempts'] for e in failed), MAX_RETRY_DELAY))
+
+    def _forward(self, batch):
+        """Ship one batch upstream.
+
+        Returns (failed, retry_later): the whole batch if the upstream looks unreachable, and
+        otherwise the events that failed on their own and should be retried separately.
+        """
+        # Images first, in parallel over the pooled connections; already-uploaded ones are kept on retry.
+        to_upload = [e for e in batch if e['image_url'] is None]
+        for event, url in zip(to_upload, self._pool.map(self.upstream.upload_image,
+                                                       [e['image'] for e in to_upload])):
+            if url:
+                event['image_url'] = url
+                event['image'] = None
+            elif event['attempts'] + 1 >= MAX_ATTEMPTS:
+                event['image_url'] = PLACEHOLDER_IMAGE_URL
+
+        retry = [e for e in batch if e['image_url'] is None]
+        uploaded = [e for e in batch if e['image_url'] is not None]
+        if not uploaded:
+            return retry, []
+
+        # detections.camera_id is the upstream camera UUID; a row without one would fail the
+        # whole bulk insert, so events whose camera can't be resolved yet are retried on their own.
+        rows, ready = [], []
+        for event in uploaded:
+            meta = event['meta']
+            if not meta.get('zone'):
+                self._drop([event], 'no zone to resolve the camera from')
+                continue
+            camera_id = self.upstream.camera_id(meta['zone'])
+            if camera_id is None:
+                retry.append(event)
+                continue
+            ready.append(event)
+            rows.append({
+                'camera_id': camera_id,
+                'violation_type': meta['violation_type'],
+                'confidence': int(meta.get('confidence', 0.75) * 100),
+                'severity': meta.get('severity', 'medium'),
+                'status': 'new',
+                'image_url': event['image_url'],
+                'detected_at': meta.get('detected_at') or datetime.fromtimestamp(
+                    event['received_at'], timezone.utc).isoformat(),
+            })
+
+        if not rows:
+            return [], retry
+        result = self.upstream.insert_detections(rows)
+        if result == 'retry':
+            return ready, retry
+        if result == 'rejected':
+            self._drop(ready, 'rejected by upstream')
+            return [], retry
+        with self._cond:
+            self.counters['forwarded'] += len(ready)
+            self.counters['batches'] += 1
+        return [], retry
+
+    def _requeue(self, events, later=False):
+        """Queue failed events again: at the front, or (later=True) after a per-event back-off."""
+        keep = []
+        for event in events:
+            event['attempts'] += 1
+            if event['attempts'] >= MAX_ATTEMPTS:
+                self._drop([event], 'too many attempts')
+            else:
+                keep.append(event)
+        now = time.time()
+        with self._cond:
+            self.counters['retried'] += len(keep)
+            if later:
+                for event in keep:
+                    event['due_at'] = now + min(2 ** event['attempts'], MAX_RETRY_DELAY)
+                self._retrying.extend(keep)
+            else:
+                self._pending.extendleft(reversed(keep))
+
+    def _drop(self, events, reason):
+        for event in events:
+            log.error('event_dropped', reason, violation=event['meta']['violation_type'],
+                      camera_id=event['meta'].get('camera_id'), zone=event['meta'].get('zone'),
+                      attempts=event['attempts'])
+        with self._cond:
+            self.counters['dropped'] += len(events)
+
+
+# ===== HTTP SERVER =====
+
+class AggregatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, aggregator, token=AUTH_TOKEN):
+        super().__init__(address, AggregatorRequestHandler)
+        self.aggregator = aggregator
+        self.token = token
+
+
+class AggregatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive: workers reuse one connection per process
+    disable_nagle_algorithm = True  # Small replies must not wait on delayed ACKs
+    timeout = REQUEST_TIMEOUT  # Idle or stalled connections release their thread
+
+    def do_POST(self):
+        # Error replies sent before the body is read close the connection, so the unread body
+        # can't be parsed as the next keep-alive request.
+        if not self._authorized():
+            return self._reply(401, {'error': 'invalid token'}, close=True)
+        if self.path != '/v1/detections':
+            return self._reply(404, {'error': 'not found'}, close=True)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self._reply(400, {'error': 'invalid Content-Length'}, close=True)
+        if length > MAX_EVENT_BYTES:
+            return self._reply(413, {'error': f'event larger than {MAX_EVENT_BYTES} bytes'}, close=True)
+        body = self.rfile.read(length)
+        try:
+            meta, jpeg_bytes = decode_event(body)
+        except ValueError as e:
+            return self._reply(400, {'error': str(e)})
+        result = self.server.aggregator.submit(meta, jpeg_bytes, length)
+        if result == 'full':
+            return self._reply(503, {'error': 'queue full'})
+        self._reply(202, {'status': result})
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self._reply(200, {'status': 'ok'})
+        if not self._authorized():
+            return self._reply(401, {'error': 'invalid token'})
+        if self.path == '/stats':
+            return self._reply(200, self.server.aggregator.stats())
+        self._reply(404, {'error': 'not found'})
+
+    def _authorized(self):
+        if not self.server.token:
+            return True  # Loopback-only when no token is configured (see main)
+        return hmac.compare_digest(self.headers.get('X-Aggregator-Token', ''), self.server.token)
+
+    def _reply(self, status, payload, close=False):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('aggregator_request', format % args, client=self.client_address[0])
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+
+def start_aggregator(upstream_url, upstream_key, host=LISTEN_HOST, port=LISTEN_PORT,
+                     gzip_rows=UPSTREAM_GZIP, token=AUTH_TOKEN, **options):
+    """Start an aggregator and its HTTP server on daemon threads. Returns (server, aggregator)."""
+    if not token and not is_loopback(host):
+        raise ValueError(f"Refusing to listen on {host} without a token - set AGGREGATOR_TOKEN")
+    upstream = UpstreamClient(upstream_url, upstream_key, gzip_rows=gzip_rows)
+    aggregator = Aggregator(upstream, **options).start()
+    server = AggregatorServer((host, port), aggregator, token)
+    threading.Thread(target=server.serve_forever, name='aggregator-http', daemon=True).start()
+    log.info('aggregator_started', url=f'http://{host}:{server.server_port}/', upstream=upstream_url)
+    return server, aggregator
+
+
+def main():
+    setup_event_logging(os.environ.get('AGGREGATOR_LOG_LEVEL', 'INFO'))
+
+    upstream_url, upstream_key = UPSTREAM_URL, UPSTREAM_KEY
+    if not upstream_url or not upstream_key:
+        from real_time_monitor import SUPABASE_URL, SUPABASE_ANON_KEY
+        upstream_url = upstream_url or SUPABASE_URL
+        upstream_key = upstream_key or SUPABASE_ANON_KEY
+
+    try:
+        server, aggregator = start_aggregator(upstream_url, upstream_key)
+    except (ValueError, OSError) as e:
+        log.error('aggregator_start_failed', str(e), host=LISTEN_HOST, port=LISTEN_PORT)
+        return 1
+    try:
+        while True:
+            time.sleep(STATS_LOG_INTERVAL)
+            log.info('aggregator_stats', **aggregator.stats())
+    except KeyboardInterrupt:
+        log.info('aggregator_stopping', queued=aggregator.stats()['queued'])
+    finally:
+        server.shutdown()
+        aggregator.stop()
+        log.info('aggregator_stopped', **aggregator.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Live annotated preview for the real-time monitor (MJPEG over HTTP).
+Boxes are drawn from the detection results the monitor already has, each frame is
+JPEG-encoded once and the same bytes are sent to every connected viewer. Viewers only
+ever get the latest frame; a viewer that can't keep up is disconnected, never buffered.
+
+Endpoints:
+    /                          list of cameras
+    /cameras/<camera_id>.mjpg  live stream
+    /cameras/<camera_id>.jpg   latest snapshot
+"""
+
+import html
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from event_log import get_event_logger
+
+BOUNDARY = 'frame'
+SEND_TIMEOUT = 2.0  # Seconds a viewer may take to accept one frame before it is dropped
+SEND_BUFFER_BYTES = 256 * 1024  # Keep kernel-side buffering per viewer small
+IDLE_TIMEOUT = 10.0  # Seconds without a new frame before the last one is re-sent (detects dead viewers)
+
+log = get_event_logger(component='preview')
+
+
+class PreviewChannel:
+    """Latest encoded frame for one camera, shared by all of its viewers."""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.viewers = 0
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def has_viewers(self):
+        return self.viewers > 0
+
+    def add_viewer(self):
+        with self._cond:
+            self.viewers += 1
+            return self.viewers
+
+    def remove_viewer(self):
+        with self._cond:
+            self.viewers -= 1
+            return self.viewers
+
+    def publish(self, jpeg_bytes):
+        with self._cond:
+            self._jpeg = jpeg_bytes
+            self._seq += 1
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._seq, self._jpeg
+
+    def wait_next(self, last_seq, timeout):
+        """Block until a frame newer than last_seq is published (or timeout). Returns (seq, jpeg)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout)
+            return self._seq, self._jpeg
+
+
+class PreviewServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, PreviewRequestHandler)
+        self.channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, camera_id):
+        """Get (or create) the channel for a camera."""
+        with self._lock:
+            if camera_id not in self.channels:
+                self.channels[camera_id] = PreviewChannel(camera_id)
+            return self.channels[camera_id]
+
+
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = unquote(self.path.split('?', 1)[0])
+        if path == '/':
+            return self._send_index()
+        if path.startswith('/cameras/'):
+            name = path[len('/cameras/'):]
+            camera_id, _, ext = name.rpartition('.')
+            channel = self.server.channels.get(camera_id)
+            if channel is not None and ext == 'mjpg':
+                return self._stream(channel)
+            if channel is not None and ext == 'jpg':
+                return self._snapshot(channel)
+        self.send_error(404)
+
+    def _send_index(self):
+        links = ''.join(
+            f'<li><a href="/cameras/{html.escape(cid)}.mjpg">{html.escape(cid)}</a></li>'
+            for cid in sorted(self.server.channels)
+        )
+        body = f'<html><body><h1>Live preview</h1><ul>{links}</ul></body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _snapshot(self, channel):
+        _, jpeg = channel.latest()
+        if jpeg is None:
+            return self.send_error(503, 'No frame yet')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(jpeg)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def _stream(self, channel):
+        self.connection.settimeout(SEND_TIMEOUT)
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        viewers = channel.add_viewer()
+        log.info('preview_viewer_connected', camera_id=channel.camera_id,
+                 client=self.client_address[0], viewers=viewers)
+        last_seq = 0
+        try:
+            while True:
+                seq, jpeg = channel.wait_next(last_seq, IDLE_TIMEOUT)
+                last_seq = seq  # Advance even on an empty frame, or wait_next returns at once again
+                if jpeg is None:
+                    continue
+                self.wfile.write(
+                    f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n'.encode()
+                    + jpeg + b'\r\n'
+                )
+        except (OSError, ValueError) as e:
+            # Includes socket.timeout: a slow viewer is dropped rather than buffered.
+            log.info('preview_viewer_disconnected', camera_id=channel.camera_id,
+                     client=self.client_address[0], reason=type(e).__name__)
+        finally:
+            channel.remove_viewer()
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        log.debug('preview_request', format % args, client=self.client_address[0])
+
+
+def annotate_frame(frame, results, names, min_confidence=0.0):
+    """Draw the boxes from existing YOLO results onto a copy of the frame."""
+    import cv2
+    annotated = frame.copy()
+    boxes = results[0].boxes
+    if boxes is None or len(boxes) == 0:
+        return annotated
+
+    for xyxy, cls, conf in zip(boxes.xyxy.tolist(), boxes.cls.tolist(), boxes.conf.tolist()):
+        if conf < min_confidence:
+            continue
+        label = names[int(cls)]
+        color = (0, 0, 255) if label.startswith('NO-') else (0, 200, 0)  # BGR: red for violations
+        x1, y1, x2, y2 = (int(v) for v in xyxy)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(annotated, f'{label} {conf:.0%}', (x1, max(y1 - 6, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return annotated
+
+
+def encode_jpeg(frame, quality=70):
+    """JPEG-encode a frame once; the bytes are shared by every viewer."""
+    import cv2
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+def start_preview_server(host='127.0.0.1', port=8090):
+    """Start the preview server on a daemon thread and return it."""
+    server = PreviewServer((host, port))
+    thread = threading.Thread(target=server.serve_forever, name='preview-server', daemon=True)
+    thread.start()
+    log.info('preview_server_started', url=f'http://{host}:{server.server_port}/')
+    return server
@@ -0,0 +1,369 @@
+"""
+Host Capacity Profiler
+Run this on the target machine before deployment to see how many cameras it can handle.
+It measures, using recorded clips or the dataset/images samples:
+  - frame decode cost per stream resolution
+  - inference latency for each available model backend (.pt / .onnx / .engine / OpenVINO) and batch size
+  - analyze_detection cost
+  - JPEG encode cost (what every violation pays before upload)
+  - upload round-trip time to a configurable endpoint (e.g. a local mock)
+and recommends an analysis interval and maximum camera count for a latency target. Camera limits
+are for batch size 1 (what real_time_monitor.py runs); a cheaper larger batch is shown separately,
+since it needs a worker that batches frames from several cameras.
+
+Usage:
+    python profile_capacity.py
+    python profile_capacity.py --clips site1.mp4 site2.mp4 --upload-url http://127.0.0.1:9000/upload
+    python profile_capacity.py --latency-target-ms 500 --cameras 12 --cprofile capacity.prof
+
+--upload-url must accept a POST of a raw JPEG and answer 2xx (e.g. a local mock or a storage
+endpoint that allows anonymous uploads); the aggregator's /health and /v1/detections don't.
+Non-2xx replies are reported and left out of the recommendations.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+import real_time_monitor as monitor
+
+DEFAULT_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset', 'images')
+DEFAULT_RESOLUTIONS = '640x480,1280x720,1920x1080'
+DEFAULT_BATCH_SIZES = '1,2,4,8'
+UTILIZATION = 0.8  # Only plan to use this fraction of the host, leaving headroom for spikes
+BACKEND_SUFFIXES = ['.pt', '.onnx', '.engine', '.torchscript', '_openvino_model']
+
+
+# ===== MEASUREMENT HELPERS =====
+
+def timed(fn, iterations):
+    """Run fn `iterations` times; return per-call seconds (median, p95)."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)]
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in item.lower().split('x')) for item in text.split(',') if item]
+
+
+def load_sample_frames(images_dir, limit=16):
+    """Load sample frames from dataset images (any depth)."""
+    import cv2
+    paths = sorted(glob.glob(os.path.join(images_dir, '**', '*.jpg'), recursive=True)
+                   + glob.glob(os.path.join(images_dir, '**', '*.png'), recursive=True))
+    frames = [cv2.imread(p) for p in paths[:limit]]
+    return [f for f in frames if f is not None]
+
+
+def find_backends(model_path):
+    """Return the model exports sitting next to model_path (best.pt, best.onnx, best.engine, ...)."""
+    stem = os.path.splitext(model_path)[0]
+    return [stem + suffix for suffix in BACKEND_SUFFIXES if os.path.exists(stem + suffix)]
+
+
+# ===== MEASUREMENTS =====
+
+def measure_clip_decode(clips, max_frames):
+    """Decode recorded clips; returns {resolution: seconds per frame}."""
+    import cv2
+    results = {}
+    for clip in clips:
+        cap = cv2.VideoCapture(clip)
+        if not cap.isOpened():
+            print(f"⚠️  Could not open clip: {clip}")
+            continue
+        frames, elapsed, size = 0, 0.0, None
+        while frames < max_frames:
+            start = time.perf_counter()
+            ok, frame = cap.read()
+            if not ok:
+                break
+            elapsed += time.perf_counter() - start
+            frames += 1
+            size = f"{frame.shape[1]}x{frame.shape[0]}"
+        cap.release()
+        if frames:
+            results.setdefault(size, []).append(elapsed / frames)
+            print(f"   {os.path.basename(clip)} ({size}): {ms(elapsed / frames)} ms/frame over {frames} frames")
+    return {size: statistics.mean(values) for size, values in results.items()}
+
+
+def measure_jpeg_costs(frames, resolutions, iterations):
+    """JPEG decode (stand-in for stream decode when no clips are given) and encode per resolution."""
+    import cv2
+    results = {}
+    for width, height in resolutions:
+        frame = cv2.resize(frames[0], (width, height))
+        jpeg = monitor.frame_to_jpeg(frame)
+        decode = timed(lambda: cv2.imdecode(jpeg_array(jpeg), cv2.IMREAD_COLOR), iterations)
+        encode = timed(lambda: monitor.frame_to_jpeg(frame), iterations)
+        results[f"{width}x{height}"] = {'decode': decode[0], 'encode': encode[0], 'jpeg_kb': len(jpeg) / 1024}
+        print(f"   {width}x{height}: decode {ms(decode[0])} ms, encode {ms(encode[0])} ms "
+              f"({len(jpeg) / 1024:.0f} KB)")
+    return results
+
+
+def jpeg_array(jpeg):
+    import numpy as np
+    return np.frombuffer(jpeg, dtype=np.uint8)
+
+
+def measure_inference(backend, frames, batch_sizes, iterations):
+    """Inference latency per batch size for one backend. Returns (model, {batch: seconds}, last_results)."""
+    try:
+        from ultralytics import YOLO
+        model = YOLO(backend)
+        model(frames[0], verbose=False)  # Warm-up
+    except Exception as e:
+        print(f"   ❌ {os.path.basename(backend)}: could not load ({e})")
+        return None, {}, None
+
+    latencies = {}
+    for batch_size in batch_sizes:
+        batch = [frames[i % len(frames)] for i in range(batch_size)]
+        try:
+            model(batch, verbose=False)  # Warm-up for this batch shape
+            median, p95 = timed(lambda: model(batch, verbose=False), iterations)
+        except Exception as e:
+            print(f"   ⚠️  {os.path.basename(backend)} batch {batch_size}: not supported ({e})")
+            continue
+        latencies[batch_size] = median
+        print(f"   {os.path.basename(backend)} batch {batch_size}: {ms(median)} ms/batch "
+              f"(p95 {ms(p95)}), {ms(median / batch_size)} ms/frame")
+    last_results = model(frames[0], verbose=False) if latencies else None
+    return model, latencies, last_results
+
+
+def measure_analysis(model, results, iterations):
+    """Cost of analyze_detection on real results."""
+    median, _ = timed(lambda: monitor.analyze_detection(results, model), iterations)
+    print(f"   analyze_detection: {ms(median)} ms")
+    return median
+
+
+def measure_upload(url, jpeg, count):
+    """Round-trip time for POSTing one violation-sized JPEG to url."""
+    import requests
+    session = requests.Session()
+    samples, statuses = [], {}
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            response = session.post(url, data=jpeg, headers={'Content-Type': 'image/jpeg'}, timeout=15)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        except requests.exceptions.RequestException as e:
+            print(f"   ❌ Upload to {url} failed: {e}")
+            return None
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    print(f"   {url}: {ms(median)} ms median RTT over {count} uploads (status codes: {statuses})")
+    if any(status >= 300 for status in statuses):
+        print("   ⚠️  Endpoint did not accept the upload - that RTT is for an error reply, so it is not used")
+        return None
+    return median
+
+
+# ===== RECOMMENDATION =====
+
+def recommend(backend_latencies, decode, analysis, encode, upload, args):
+    """Derive interval / camera limits per backend for the latency target.
+
+    The limits come from batch size 1, which is what real_time_monitor.py runs (one frame per
+    model() call). If a larger batch is cheaper per camera, it is reported separately under
+    'batched'; using it requires a multi-camera batched worker.
+    """
+    target = args.latency_target_ms / 1000
+    push_cost = args.violation_rate * (encode + (upload or 0))
+
+    def option(batch_size, batch_latency):
+        # Worst case: a violation frame waits for a full batch, then is encoded and uploaded.
+        frame_latency = decode + batch_latency + analysis + encode + (upload or 0)
+        per_camera_cost = decode + batch_latency / batch_size + analysis + push_cost
+        result = {
+            'batch_size': batch_size,
+            'frame_latency_ms': ms(frame_latency),
+            'meets_latency_target': frame_latency <= target,
+            'per_camera_cost_ms': ms(per_camera_cost),
+            'max_cameras': int(args.interval * UTILIZATION / per_camera_cost),
+            'analysis_interval_s': args.interval,
+        }
+        if args.cameras:
+            result['min_interval_for_cameras_s'] = round(
+                max(args.cameras * per_camera_cost / UTILIZATION, frame_latency), 2)
+        return result, per_camera_cost
+
+    recommendations = {}
+    for backend, latencies in backend_latencies.items():
+        if 1 not in latencies:
+            continue
+        recommendation, single_cost = option(1, latencies[1])
+        batched = [option(batch_size, batch_latency) for batch_size, batch_latency in latencies.items()
+                   if batch_size > 1]
+        batched = [(cost, result) for result, cost in batched if result['meets_latency_target']]
+        if batched:
+            cost, best = min(batched, key=lambda item: item[0])
+            if cost < single_cost:
+                best['requires'] = 'multi-camera batched worker (real_time_monitor.py runs batch 1)'
+                recommendation['batched'] = best
+        recommendations[backend] = recommendation
+    return recommendations
+
+
+def run(args):
+    import cv2
+
+    print("=" * 60)
+    print("🖥️  Host Capacity Profiler")
+    print("=" * 60)
+
+    frames = load_sample_frames(args.images)
+    if args.clips:
+        cap = cv2.VideoCapture(args.clips[0])
+        ok, frame = cap.read()
+        cap.release()
+        if ok:
+            frames.insert(0, frame)
+    if not frames:
+        print(f"❌ No sample frames found (looked in {args.images} and --clips)")
+        return 1
+    print(f"✅ {len(frames)} sample frames")
+
+    resolutions = parse_resolutions(args.resolutions)
+    batch_sizes = sorted({1, *(int(b) for b in args.batch_sizes.split(',') if b)})  # 1 is what the monitor runs
+
+    print("\n📹 Decode / encode cost per resolution:")
+    clip_decode = {}
+    if args.clips:
+        print("   Recorded clips (actual stream decode):")
+        clip_decode = measure_clip_decode(args.clips, args.clip_frames)
+    # The clips' real resolutions (and --stream-resolution) always get an encode measurement too
+    for size in parse_resolutions(','.join([*clip_decode, args.stream_resolution or ''])):
+        if size not in resolutions:
+            resolutions.append(size)
+    jpeg_costs = measure_jpeg_costs(frames, resolutions, args.iterations)
+    decode_costs = {size: cost['decode'] for size, cost in jpeg_costs.items()}
+    decode_costs.update(clip_decode)  # Real stream decode replaces the JPEG stand-in
+
+    if args.stream_resolution:
+        stream_size = '{}x{}'.format(*parse_resolutions(args.stream_resolution)[0])
+    else:
+        stream_size = next(iter(clip_decode), None) or next(iter(decode_costs))
+    if stream_size not in decode_costs or stream_size not in jpeg_costs:
+        print(f"❌ --stream-resolution {stream_size} was not measured; add it to --resolutions")
+        return 1
+
+    print("\n🧠 Inference latency per backend and batch size:")
+    backends = args.models or find_backends(monitor.YOLO_MODEL_PATH)
+    if not backends:
+        print(f"❌ No model found at {monitor.YOLO_MODEL_PATH} (use --models)")
+        return 1
+    backend_latencies, analysis = {}, None
+    for backend in backends:
+        model, latencies, results = measure_inference(backend, frames, batch_sizes, args.iterations)
+        if latencies:
+            backend_latencies[backend] = latencies
+        if analysis is None and results is not None:
+            analysis = measure_analysis(model, results, args.iterations * 10)
+    if not backend_latencies:
+        print("❌ No backend could run inference")
+        return 1
+
+    upload = None
+    if args.upload_url:
+        print("\n📤 Upload round-trip:")
+        upload = measure_upload(args.upload_url, monitor.frame_to_jpeg(frames[0]), args.upload_count)
+
+    recommendations = recommend(backend_latencies, decode_costs[stream_size], analysis or 0,
+                                jpeg_costs[stream_size]['encode'], upload, args)
+
+    print("\n" + "=" * 60)
+    print(f"💡 Recommendations ({stream_size} streams, latency target {args.latency_target_ms:.0f} ms, "
+          f"{args.violation_rate:.0%} violation frames, {UTILIZATION:.0%} utilization)")
+    print("=" * 60)
+    for backend, rec in recommendations.items():
+        status = '✅' if rec['meets_latency_target'] else '⚠️ '
+        print(f"{status} {os.path.basename(backend)} (batch 1, as deployed): "
+              f"{rec['per_camera_cost_ms']} ms per camera per analysis, "
+              f"worst-case frame latency {rec['frame_latency_ms']} ms")
+        print(f"   → max {rec['max_cameras']} cameras at DETECTION_INTERVAL = {args.interval}s")
+        if 'min_interval_for_cameras_s' in rec:
+            print(f"   → {args.cameras} cameras need DETECTION_INTERVAL >= {rec['min_interval_for_cameras_s']}s")
+        if 'batched' in rec:
+            batched = rec['batched']
+            print(f"   ℹ️  Batch {batched['batch_size']} would cost {batched['per_camera_cost_ms']} ms per camera "
+                  f"(max {batched['max_cameras']} cameras) but requires a multi-camera batched worker")
+    if upload is None:
+        print("\nℹ️  Upload time not measured (use --upload-url); recommendations exclude it.")
+
+    if args.json:
+        report = {
+            'stream_resolution': stream_size,
+            'decode_ms': {k: ms(v) for k, v in decode_costs.items()},
+            'jpeg_encode_ms': {k: ms(v['encode']) for k, v in jpeg_costs.items()},
+            'inference_ms': {b: {n: ms(s) for n, s in l.items()} for b, l in backend_latencies.items()},
+            'analyze_detection_ms': ms(analysis or 0),
+            'upload_rtt_ms': ms(upload) if upload is not None else None,
+            'recommendations': recommendations,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Report written to {args.json}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clips', nargs='*', default=[], help='Recorded video clips to decode')
+    parser.add_argument('--images', default=DEFAULT_IMAGES_DIR, help='Directory of sample images')
+    parser.add_argument('--models', nargs='*', help='Model files to compare (default: exports next to YOLO_MODEL_PATH)')
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS, help='WxH list for decode/encode cost')
+    parser.add_argument('--stream-resolution', help='Resolution of the real streams (default: first clip, '
+                                                    'else first of --resolutions)')
+    parser.add_argument('--batch-sizes', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--clip-frames', type=int, default=300, help='Max frames to decode per clip')
+    parser.add_argument('--upload-url', help='Endpoint that accepts a POSTed JPEG with 2xx, for round-trip time')
+    parser.add_argument('--upload-count', type=int, default=10)
+    parser.add_argument('--latency-target-ms', type=float, default=1000)
+    parser.add_argument('--interval', type=float, default=monitor.DETECTION_INTERVAL,
+                        help='Analysis interval (seconds) to size for')
+    parser.add_argument('--cameras', type=int, help='Camera count to find the minimum analysis interval for')
+    parser.add_argument('--violation-rate', type=float, default=0.1, help='Fraction of frames with violations')
+    parser.add_argument('--cprofile', nargs='?', const='', help='Profile the run; optionally save stats to FILE')
+    parser.add_argument('--json', help='Also write the measurements and recommendations to this file')
+    args = parser.parse_args()
+
+    if args.cprofile is None:
+        return run(args)
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return run(args)
+    finally:
+        profiler.disable()
+        if args.cprofile:
+            profiler.dump_stats(args.cprofile)
+            print(f"\n📝 cProfile stats written to {args.cprofile}")
+        print("\n🔬 Top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,24 +2,27 @@
 Real-Time CCTV Monitor with YOLO Detection
 This script connects to a CCTV camera, runs YOLO detection, and pushes violations to Supabase.
 It also triggers local alarms and phone calls for serious violations.
+
+Run with --headless (or MONITOR_HEADLESS=1) under a process supervisor: it never prompts,
+runs read-only preflight checks concurrently and warms the model up before the first frame.
 """
 
-import cv2
 import base64
 import time
 import os
+import sys
 import platform
+import threading
+from concurrent.futures import Future
 import requests
-from ultralytics import YOLO
+from event_log import setup_event_logging, get_event_logger
+from preview_server import start_preview_server, annotate_frame, encode_jpeg
+from ingest_aggregator import CONTENT_TYPE as AGGREGATOR_CONTENT_TYPE, encode_event
+from spatial_masks import build_spatial_mask
 
-# Optional: Twilio for phone calls (install with: pip install twilio)
-try:
-    from twilio.rest import Client
-    TWILIO_AVAILABLE = True
-except ImportError:
-    TWILIO_AVAILABLE = False
-    print("⚠️  Twilio not installed - phone call alerts will be disabled")
-    print("   Install with: pip install twilio")
+# Heavy modules (cv2, ultralytics, twilio) are imported inside the functions that need them
+# so that startup only pays for them once, and only when they are actually used.
+STARTUP_TIME = time.perf_counter()
 
 # ===== CONFIGURATION =====
 # Camera Configuration
@@ -33,12 +36,29 @@ SUPABASE_URL = 'https://iscxriwdxxvzhcoguvyk.supabase.co'  # Your Supabase proje
 CAMERA_ID = 'default-camera-1'  # Update with your actual camera ID from database
 CAMERA_ZONE = 'Zone A'  # Update with your zone
 
+# Site-local ingest aggregator (ingest_aggregator.py). When set, detections are sent there and
+# batched upstream; Supabase is only used directly if the aggregator is unreachable or full.
+INGEST_AGGREGATOR_URL = os.environ.get('INGEST_AGGREGATOR_URL', '')  # e.g. 'http://192.168.1.10:8787'
+INGEST_AGGREGATOR_TOKEN = os.environ.get('INGEST_AGGREGATOR_TOKEN', '')  # Must match the aggregator's AGGREGATOR_TOKEN
+AGGREGATOR_TIMEOUT = (0.5, 5)  # (connect, read) seconds - a dead aggregator must not stall the loop
+AGGREGATOR_COOLDOWN = 60  # Seconds to go straight to Supabase after the aggregator fails
+
 # Supervisor phone numbers by zone
 CAMERA_TO_SUPERVISOR = {
     "Zone A": "+1234567890",  # UPDATE with real supervisor phone
     "Zone B": "+1987654321",
 }
 
+# Spatial masks by zone. Polygons are lists of (x, y) points in normalized 0-1 frame coordinates.
+# 'roi': only this area is analyzed (the frame is cropped to it before inference).
+# 'exclude': detections centred in these areas are ignored (public walkways, parking, reflections).
+ZONE_MASKS = {
+    "Zone A": {
+        'roi': None,  # e.g. [(0.05, 0.2), (0.95, 0.2), (0.95, 1.0), (0.05, 1.0)]
+        'exclude': [],  # e.g. [[(0.0, 0.6), (0.25, 0.6), (0.25, 1.0), (0.0, 1.0)]]
+    },
+}
+
 # Twilio Configuration (for phone calls)
 TWILIO_SID = "YOUR_TWILIO_ACCOUNT_SID"  # UPDATE THIS!
 TWILIO_TOKEN = "YOUR_TWILIO_AUTH_TOKEN"  # UPDATE THIS!
@@ -50,11 +70,34 @@ DETECTION_INTERVAL = 1  # Analyze 1 frame per second (adjust as needed)
 MIN_CONFIDENCE = 0.6  # Minimum confidence threshold for detections
 VIOLATION_CLASSES = ['NO-Mask', 'NO-Hardhat', 'NO-Safety Vest', 'Person', 'Safety Vest']  # Your model classes
 
+# Startup Settings
+HEADLESS = os.environ.get('MONITOR_HEADLESS', '0') == '1'  # Never prompt, read-only concurrent preflight
+PREFLIGHT_TIMEOUT = 30  # Max seconds to wait for model load / camera open / Supabase check
+WARMUP_FRAME_SIZE = (640, 480)  # (width, height) of the dummy frame used to warm up the model
+
+# Live Preview Settings (MJPEG over HTTP: http://<host>:<port>/cameras/<CAMERA_ID>.mjpg)
+PREVIEW_ENABLED = os.environ.get('MONITOR_PREVIEW', '0') == '1'
+PREVIEW_HOST = os.environ.get('MONITOR_PREVIEW_HOST', '127.0.0.1')  # '0.0.0.0' allows viewers from other machines
+PREVIEW_PORT = int(os.environ.get('MONITOR_PREVIEW_PORT', '8090'))  # One port per camera process on a host
+PREVIEW_JPEG_QUALITY = 70
+
+# Logging Settings (JSON lines on stdout, written from a background thread)
+LOG_LEVEL = os.environ.get('MONITOR_LOG_LEVEL', 'INFO')
+LOG_FRAME_EVENTS_PER_SECOND = 0.2  # Max per-frame events (frame status, grab failures...) per type
+LOG_FRAME_SAMPLE_RATE = 1.0  # Fraction of per-frame events considered before rate-limiting
+
+log = get_event_logger(
+    frame_events_per_second=LOG_FRAME_EVENTS_PER_SECOND,
+    frame_sample_rate=LOG_FRAME_SAMPLE_RATE,
+    camera_id=CAMERA_ID,
+    zone=CAMERA_ZONE,
+)
+
 # ===== FUNCTIONS =====
 
 def sound_alarm():
     """Play a loud alarm sound on the local device."""
-    print("🔔 ALARM: Violation detected!")
+    log.warning('alarm', 'Violation detected')
     try:
         for _ in range(3):
             if platform.system() == "Windows":
@@ -63,33 +106,43 @@ def sound_alarm():
             elif platform.system() == "Darwin":  # macOS
                 os.system('say "Warning! Safety violation detected!"')
             else:  # Linux
-                os.system('play -nq -t alsa synth 1 sine 1600 2>/dev/null || echo "Alarm!"')
+                # Keep sox output off stdout, which carries the JSON event stream
+                if os.system('play -nq -t alsa synth 1 sine 1600 >/dev/null 2>&1') != 0:
+                    log.warning('alarm_failed', 'Could not play alarm sound (is sox installed?)')
+                    break
     except Exception as e:
-        print(f"Could not play alarm: {e}")
+        log.warning('alarm_failed', str(e))
 
 def make_voice_call(message: str, supervisor_number: str):
     """Make a voice call to supervisor using Twilio."""
-    if not TWILIO_AVAILABLE:
-        print(f"⚠️  Twilio not available - skipping phone call to {supervisor_number}")
-        print(f"   Message would be: {message}")
+    # Optional: Twilio for phone calls (install with: pip install twilio)
+    try:
+        from twilio.rest import Client
+    except ImportError:
+        log.warning('call_skipped', 'Twilio not installed (pip install twilio)',
+                    supervisor=supervisor_number, message=message)
         return
     
     try:
-        print(f"📞 Calling supervisor {supervisor_number}...")
         client = Client(TWILIO_SID, TWILIO_TOKEN)
         call = client.calls.create(
             twiml=f'<Response><Say voice="alice">{message}</Say></Response>',
             to=supervisor_number,
             from_=TWILIO_NUMBER
         )
-        print(f"✅ Call initiated: {call.sid}")
+        log.info('call_initiated', supervisor=supervisor_number, call_sid=call.sid)
     except Exception as e:
-        print(f"❌ Failed to make call: {e}")
+        log.error('call_failed', str(e), supervisor=supervisor_number)
 
-def frame_to_base64(frame):
-    """Convert OpenCV frame to base64 data URL."""
+def frame_to_jpeg(frame):
+    """Encode OpenCV frame as JPEG bytes."""
+    import cv2
     _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-    return "data:image/jpeg;base64," + base64.b64encode(buffer).decode()
+    return buffer.tobytes()
+
+def jpeg_to_base64(jpeg_bytes):
+    """Convert JPEG bytes to a base64 data URL."""
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode()
 
 def upload_image_to_storage(img_b64, violation_type):
     """Upload image to Supabase storage and return public URL."""
@@ -122,10 +175,10 @@ def upload_image_to_storage(img_b64, violation_type):
             public_url = f"{SUPABASE_URL}/storage/v1/object/public/detection-images/{filename}"
             return public_url
         else:
-            print(f"⚠️ Image upload failed: {response.status_code} - {response.text[:100]}")
+            log.warning('image_upload_failed', response.text[:200], status=response.status_code)
             return None
     except Exception as e:
-        print(f"⚠️ Error uploading image: {e}")
+        log.warning('image_upload_failed', str(e))
         return None
 
 def ensure_camera_exists(camera_id, camera_zone):
@@ -164,16 +217,16 @@ def ensure_camera_exists(camera_id, camera_zone):
             created_camera = response.json()
             if isinstance(created_camera, list) and len(created_camera) > 0:
                 actual_camera_id = created_camera[0]['id']
-                print(f"✅ Created camera: {actual_camera_id} for {camera_zone}")
+                log.info('camera_created', db_camera_id=actual_camera_id)
                 return actual_camera_id
             else:
-                print(f"⚠️ Camera created but couldn't get ID")
+                log.warning('camera_create_failed', 'Camera created but response had no ID')
                 return None
         else:
-            print(f"⚠️ Could not create camera: {response.status_code} - {response.text[:100]}")
+            log.warning('camera_create_failed', response.text[:200], status=response.status_code)
             return None
     except Exception as e:
-        print(f"⚠️ Error checking/creating camera: {e}")
+        log.warning('camera_create_failed', str(e))
         return None
 
 def push_detection_to_supabase(img_b64, camera_id, violation_type, severity='medium', confidence=0.75):
@@ -182,7 +235,7 @@ def push_detection_to_supabase(img_b64, camera_id, violation_type, severity='med
         # Ensure camera exists first and get actual camera UUID
         actual_camera_id = ensure_camera_exists(camera_id, CAMERA_ZONE)
         if not actual_camera_id:
-            print(f"⚠️ Could not get/create camera, using provided ID: {camera_id}")
+            log.warning('camera_fallback', 'Could not get/create camera, using configured ID')
             actual_camera_id = camera_id
         
         # Method 1: Try Edge Function first
@@ -197,21 +250,19 @@ def push_detection_to_supabase(img_b64, camera_id, violation_type, severity='med
                 'cameraId': actual_camera_id,
             }
             
-            print(f"📤 Pushing to Supabase Edge Function...")
+            start = time.perf_counter()
             response = requests.post(SUPABASE_FN_URL, json=data, headers=headers, timeout=15)
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
             
             if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Detection pushed via Edge Function: {violation_type}")
+                log.info('detection_pushed', method='edge_function', violation=violation_type, duration_ms=elapsed_ms)
                 return True
             else:
-                print(f"⚠️ Edge Function failed ({response.status_code}), trying direct insert...")
-                print(f"   Error: {response.text[:150]}")
+                log.warning('edge_function_failed', response.text[:200],
+                            status=response.status_code, duration_ms=elapsed_ms)
         
         # Method 2: Direct database insert (more reliable)
         if SUPABASE_URL and SUPABASE_ANON_KEY and 'YOUR_PROJECT_REF' not in SUPABASE_URL:
-            print(f"📤 Inserting directly to database...")
-            
             # Upload image to storage
             image_url = upload_image_to_storage(img_b64, violation_type)
             if not image_url:
@@ -236,38 +287,85 @@ def push_detection_to_supabase(img_b64, camera_id, violation_type, severity='med
             }
             
             db_url = f"{SUPABASE_URL}/rest/v1/detections"
-            print(f"   URL: {db_url}")
-            print(f"   Data: {violation_type} (severity: {severity})")
-            
+            start = time.perf_counter()
             response = requests.post(db_url, json=detection_data, headers=headers, timeout=15)
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
             
             if response.status_code in [200, 201]:
                 result = response.json()
-                print(f"✅ Detection inserted to database! ID: {result[0].get('id', 'unknown') if isinstance(result, list) and len(result) > 0 else 'success'}")
+                detection_id = result[0].get('id') if isinstance(result, list) and len(result) > 0 else None
+                log.info('detection_pushed', method='direct_insert', violation=violation_type,
+                         severity=severity, detection_id=detection_id, duration_ms=elapsed_ms)
                 return True
             else:
-                print(f"❌ Database insert failed: {response.status_code}")
-                print(f"   Full response: {response.text}")
+                log.error('detection_insert_failed', response.text[:500],
+                          status=response.status_code, duration_ms=elapsed_ms)
                 return False
         else:
-            print("❌ Supabase configuration not set properly!")
-            print(f"   SUPABASE_URL: {'✅' if SUPABASE_URL and 'YOUR_PROJECT_REF' not in SUPABASE_URL else '❌'}")
-            print(f"   SUPABASE_ANON_KEY: {'✅' if SUPABASE_ANON_KEY and 'YOUR_SUPABASE_ANON_KEY' not in SUPABASE_ANON_KEY else '❌'}")
+            log.error('supabase_not_configured',
+                      url_ok=bool(SUPABASE_URL and 'YOUR_PROJECT_REF' not in SUPABASE_URL),
+                      key_ok=bool(SUPABASE_ANON_KEY and 'YOUR_SUPABASE_ANON_KEY' not in SUPABASE_ANON_KEY))
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
+        log.error('detection_push_failed', str(e), reason='network')
         return False
-    except Exception as e:
-        print(f"❌ Error pushing to Supabase: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception('detection_push_failed')
         return False
 
+_aggregator_session = None
+_aggregator_down_until = 0
+
+def push_detection_to_aggregator(jpeg_bytes, violation_type, violation_labels, severity='medium', confidence=0.75):
+    """Send a detection to the site-local ingest aggregator as one binary event.
+    
+    Uses a keep-alive session and retries once (same event_id, so the aggregator drops the
+    duplicate if the first attempt did arrive). After a failure the aggregator is skipped for
+    AGGREGATOR_COOLDOWN seconds. Returns True if the aggregator accepted the event.
+    """
+    global _aggregator_session, _aggregator_down_until
+    if time.time() < _aggregator_down_until:
+        return False
+    if _aggregator_session is None:
+        _aggregator_session = requests.Session()
+    
+    import uuid
+    from datetime import datetime, timezone
+    meta = {
+        'event_id': uuid.uuid4().hex,
+        'camera_id': CAMERA_ID,
+        'zone': CAMERA_ZONE,
+        'violation_type': violation_type,  # Human-readable text for the detection row
+        'violation_key': ','.join(sorted(violation_labels)),  # Stable class labels, used for dedup
+        'severity': severity,
+        'confidence': confidence,
+        'detected_at': datetime.now(timezone.utc).isoformat(),
+    }
+    body = encode_event(meta, jpeg_bytes)
+    headers = {'Content-Type': AGGREGATOR_CONTENT_TYPE, 'X-Aggregator-Token': INGEST_AGGREGATOR_TOKEN}
+    
+    for attempt in range(2):
+        try:
+            start = time.perf_counter()
+            response = _aggregator_session.post(f"{INGEST_AGGREGATOR_URL}/v1/detections", data=body,
+                                                headers=headers, timeout=AGGREGATOR_TIMEOUT)
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
+            if response.status_code == 202:
+                log.info('detection_pushed', method='aggregator', violation=violation_type,
+                         status=response.json().get('status'), duration_ms=elapsed_ms)
+                return True
+            log.warning('aggregator_rejected', response.text[:200], status=response.status_code)
+            break
+        except requests.exceptions.RequestException as e:
+            log.warning('aggregator_unreachable', str(e), attempt=attempt + 1)
+    
+    _aggregator_down_until = time.time() + AGGREGATOR_COOLDOWN
+    log.warning('aggregator_cooldown', 'Sending directly to Supabase for a while', cooldown_s=AGGREGATOR_COOLDOWN)
+    return False
+
 def test_supabase_connection():
     """Test if we can connect to Supabase and insert data."""
-    print("\n🧪 Testing Supabase Connection...")
-    
     try:
         headers = {
             'apikey': SUPABASE_ANON_KEY,
@@ -280,10 +378,9 @@ def test_supabase_connection():
         response = requests.get(test_url, headers=headers, timeout=10)
         
         if response.status_code == 200:
-            print("✅ Can read from Supabase (cameras table accessible)")
+            log.info('supabase_read_ok', 'cameras table accessible')
         else:
-            print(f"⚠️ Cannot read cameras table: {response.status_code}")
-            print(f"   Response: {response.text[:200]}")
+            log.warning('supabase_read_failed', response.text[:200], status=response.status_code)
             return False
         
         # Test 2: Try to insert a test detection (will be rolled back)
@@ -304,7 +401,7 @@ def test_supabase_connection():
             response = requests.post(test_insert_url, json=test_detection, headers=headers, timeout=10)
             
             if response.status_code in [200, 201]:
-                print("✅ Can insert to Supabase (detections table accessible)")
+                log.info('supabase_insert_ok', 'detections table accessible')
                 # Try to delete the test record (optional cleanup)
                 try:
                     response_text = response.text.strip()
@@ -316,31 +413,129 @@ def test_supabase_connection():
                                 delete_url = f"{SUPABASE_URL}/rest/v1/detections?id=eq.{test_id}"
                                 delete_response = requests.delete(delete_url, headers=headers, timeout=10)
                                 if delete_response.status_code in [200, 204]:
-                                    print("✅ Test record cleaned up")
+                                    log.info('supabase_test_row_deleted')
                 except (ValueError, KeyError, requests.exceptions.JSONDecodeError) as e:
                     # Response might not be JSON or might be empty - that's okay
-                    print("ℹ️  Could not clean up test record (this is fine)")
+                    log.info('supabase_test_row_kept', 'Could not clean up test record (this is fine)')
                 return True
             else:
-                print(f"❌ Cannot insert to detections table: {response.status_code}")
-                print(f"   Response: {response.text}")
-                print(f"\n💡 This is likely an RLS (Row Level Security) issue!")
-                print(f"   Go to Supabase Dashboard → Authentication → Policies")
-                print(f"   Make sure 'detections' table has INSERT policy for authenticated users")
+                log.error('supabase_insert_failed', response.text[:500], status=response.status_code,
+                          hint="Likely RLS: make sure 'detections' has an INSERT policy "
+                               "(Supabase Dashboard > Authentication > Policies)")
                 return False
         else:
-            print("⚠️ Could not create/get camera for test")
+            log.warning('supabase_test_failed', 'Could not create/get camera for test')
             return False
             
-    except Exception as e:
-        print(f"❌ Connection test failed: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception('supabase_test_failed')
         return False
 
+def check_supabase_readonly():
+    """Read-only Supabase check for headless startup (no test rows are written or deleted)."""
+    try:
+        headers = {
+            'apikey': SUPABASE_ANON_KEY,
+            'Authorization': f'Bearer {SUPABASE_ANON_KEY}'
+        }
+        test_url = f"{SUPABASE_URL}/rest/v1/cameras?select=id&limit=1"
+        response = requests.get(test_url, headers=headers, timeout=10)
+        
+        if response.status_code == 200:
+            log.info('supabase_read_ok', 'cameras table accessible')
+            return True
+        log.warning('supabase_read_failed', response.text[:200], status=response.status_code)
+        return False
+    except requests.exceptions.RequestException as e:
+        log.warning('supabase_read_failed', str(e))
+        return False
+
+def warm_up_model(model):
+    """Run one inference on a dummy frame so the first real frame doesn't pay setup cost."""
+    import numpy as np
+    width, height = WARMUP_FRAME_SIZE
+    dummy_frame = np.zeros((height, width, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    model(dummy_frame, verbose=False)
+    log.info('model_warmed_up', duration_s=round(time.perf_counter() - start, 3))
+
+def load_model():
+    """Load and warm up the YOLO model. Returns None on failure."""
+    try:
+        from ultralytics import YOLO
+        model = YOLO(YOLO_MODEL_PATH)
+        log.info('model_loaded', path=YOLO_MODEL_PATH, classes=list(model.names.values()))
+        warm_up_model(model)
+        return model
+    except Exception:
+        log.exception('model_load_failed', path=YOLO_MODEL_PATH)
+        return None
+
+def open_camera():
+    """Open the camera stream. Returns None if it cannot be opened."""
+    import cv2
+    cap = cv2.VideoCapture(RTSP_URL if RTSP_URL != '0' else 0)
+    
+    if not cap.isOpened():
+        log.error('camera_open_failed', source=RTSP_URL)
+        cap.release()
+        return None
+    
+    log.info('camera_connected', source=RTSP_URL)
+    return cap
+
+def run_in_daemon_thread(fn, name):
+    """Run fn on a daemon thread and return a Future for its result.
+    
+    Unlike ThreadPoolExecutor workers (which are joined at interpreter exit), a hung
+    daemon thread can't keep the process alive after main() gives up on it.
+    """
+    future = Future()
+    
+    def target():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=target, name=f'preflight-{name}', daemon=True).start()
+    return future
+
+def run_preflight(check_supabase=True):
+    """Load the model, open the camera and check Supabase concurrently.
+    
+    Returns (model, cap, supabase_ok). model/cap are None if they failed or timed out.
+    """
+    model_future = run_in_daemon_thread(load_model, 'model')
+    camera_future = run_in_daemon_thread(open_camera, 'camera')
+    supabase_future = run_in_daemon_thread(check_supabase_readonly, 'supabase') if check_supabase else None
+    
+    deadline = time.perf_counter() + PREFLIGHT_TIMEOUT
+    
+    def wait_for(future, name):
+        try:
+            return future.result(timeout=max(0, deadline - time.perf_counter()))
+        except Exception as e:
+            log.error('preflight_step_failed', repr(e), step=name)
+            return None
+    
+    model = wait_for(model_future, 'model')
+    cap = wait_for(camera_future, 'camera')
+    supabase_ok = bool(wait_for(supabase_future, 'supabase')) if supabase_future else False
+    
+    # A hung step's daemon thread is simply abandoned; the process can still exit and be restarted.
+    log.info('preflight_finished', since_start_s=round(time.perf_counter() - STARTUP_TIME, 3),
+             model_ok=model is not None, camera_ok=cap is not None, supabase_ok=supabase_ok)
+    return model, cap, supabase_ok
+
 def analyze_detection(results, model):
-    """Analyze YOLO results and determine violations based on your model classes."""
+    """Analyze YOLO results and determine violations based on your model classes.
+    
+    Returns (violations, has_violation, violation_labels): human-readable violation texts, whether
+    any are real violations, and the stable class labels behind them (e.g. ['NO-Hardhat']).
+    """
     violations = []
+    violation_labels = []
     has_violation = False
     
     if results[0].boxes is not None and len(results[0].boxes) > 0:
@@ -360,10 +555,6 @@ def analyze_detection(results, model):
                 if class_name == 'Person':
                     person_detected = True
         
-        # Debug: Print detected classes (only when violations found)
-        if detected_classes:
-            detected_str = ', '.join([f"{k}: {v:.1%}" for k, v in detected_classes.items()])
-        
         # Resolve contradictory detections (e.g., both 'Hardhat' and 'NO-Hardhat') by preferring
         # the label with higher confidence. This reduces false positives where both are present.
         def is_meaningful_negative(neg_label, pos_label=None):
@@ -376,126 +567,146 @@ def analyze_detection(results, model):
                 pos_conf = detected_classes[pos_label]
                 # If positive confidence is greater or equal, ignore the negative label
                 if pos_conf >= neg_conf:
-                    print(f"⚠️ Conflicting labels: {pos_label} ({pos_conf:.1%}) vs {neg_label} ({neg_conf:.1%}) - preferring positive")
+                    log.frame('conflicting_labels', 'preferring positive label',
+                              positive=pos_label, positive_conf=round(pos_conf, 3),
+                              negative=neg_label, negative_conf=round(neg_conf, 3))
                     return False
             return True
 
         if is_meaningful_negative('NO-Hardhat', pos_label='Hardhat'):
             violations.append(f'Missing Hard Hat (Confidence: {detected_classes["NO-Hardhat"]:.1%})')
+            violation_labels.append('NO-Hardhat')
             has_violation = True
 
         if is_meaningful_negative('NO-Safety Vest', pos_label='Safety Vest'):
             violations.append(f'Missing Safety Vest (Confidence: {detected_classes["NO-Safety Vest"]:.1%})')
+            violation_labels.append('NO-Safety Vest')
             has_violation = True
 
         if is_meaningful_negative('NO-Mask', pos_label='Mask'):
             violations.append(f'Missing Mask (Confidence: {detected_classes["NO-Mask"]:.1%})')
+            violation_labels.append('NO-Mask')
             has_violation = True
         
         # If person detected but no violations, log as monitoring
         if person_detected and not has_violation:
             violations.append('Person Detected - All PPE Requirements Met')
     
-    return violations, has_violation
+    return violations, has_violation, violation_labels
 
 # ===== MAIN LOOP =====
 
-def main():
-    print("=" * 60)
-    print("🚀 Real-Time CCTV Safety Monitor Starting...")
-    print("=" * 60)
+def main(headless=False):
+    setup_event_logging(LOG_LEVEL)
+    log.info('monitor_starting', headless=headless)
     
     # Configuration check
-    print("\n📋 Configuration Check:")
     config_ok = True
     
     if 'YOUR_PROJECT_REF' in SUPABASE_FN_URL and 'YOUR_PROJECT_REF' in SUPABASE_URL:
-        print("⚠️  Supabase URL not configured!")
-        print("   Please update SUPABASE_FN_URL or SUPABASE_URL in the script")
+        log.warning('config_invalid', 'Please update SUPABASE_FN_URL or SUPABASE_URL in the script',
+                    setting='SUPABASE_URL')
         config_ok = False
     else:
-        if 'YOUR_PROJECT_REF' not in SUPABASE_FN_URL:
-            print(f"✅ Supabase Edge Function URL: {SUPABASE_FN_URL[:50]}...")
-        if 'YOUR_PROJECT_REF' not in SUPABASE_URL:
-            print(f"✅ Supabase URL: {SUPABASE_URL[:50]}...")
+        log.info('config_ok', setting='SUPABASE_URL',
+                 edge_function='YOUR_PROJECT_REF' not in SUPABASE_FN_URL,
+                 direct_insert='YOUR_PROJECT_REF' not in SUPABASE_URL)
     
     if 'YOUR_SUPABASE_ANON_KEY' in SUPABASE_ANON_KEY:
-        print("⚠️  Supabase Anon Key not configured!")
-        print("   Get it from: Supabase Dashboard > Settings > API > anon/public key")
+        log.warning('config_invalid', 'Get it from: Supabase Dashboard > Settings > API > anon/public key',
+                    setting='SUPABASE_ANON_KEY')
         config_ok = False
-    else:
-        print(f"✅ Supabase Anon Key: Configured")
     
     if not config_ok:
-        print("\n❌ Please fix configuration issues before continuing!")
-        print("   The script will still run but won't push to Supabase.")
-        input("Press Enter to continue anyway, or Ctrl+C to exit...")
+        log.warning('config_incomplete', "The script will still run but won't push to Supabase")
+        if not headless:
+            input("Press Enter to continue anyway, or Ctrl+C to exit...")
     
     # Load YOLO model
     if not os.path.exists(YOLO_MODEL_PATH):
-        print(f"\n❌ Error: Model file not found: {YOLO_MODEL_PATH}")
-        return
+        log.error('model_not_found', path=YOLO_MODEL_PATH)
+        return 1
     
-    print(f"\n📦 Loading YOLO model: {YOLO_MODEL_PATH}")
     try:
-        model = YOLO(YOLO_MODEL_PATH)
-        print(f"✅ Model loaded! Classes: {list(model.names.values())}")
-    except Exception as e:
-        print(f"❌ Error loading model: {e}")
-        return
-    
-    # Test Supabase connection
-    if config_ok:
-        connection_ok = test_supabase_connection()
-        if not connection_ok:
-            print("\n⚠️ Supabase connection test failed!")
-            print("   The script will continue, but detections may not be saved.")
-            print("   Fix the issues above before running detection.")
-            response = input("\nContinue anyway? (y/n): ")
-            if response.lower() != 'y':
-                return
+        spatial_mask = build_spatial_mask(ZONE_MASKS.get(CAMERA_ZONE), log)
+    except ValueError as e:
+        log.error('spatial_mask_invalid', str(e), zone=CAMERA_ZONE)
+        return 1
     
-    # Connect to camera
-    print(f"📹 Connecting to camera: {RTSP_URL}")
-    cap = cv2.VideoCapture(RTSP_URL if RTSP_URL != '0' else 0)
+    if headless:
+        model, cap, connection_ok = run_preflight(check_supabase=config_ok)
+        if model is None or cap is None:
+            if cap is not None:
+                cap.release()
+            return 1
+        if config_ok and not connection_ok:
+            log.warning('supabase_unavailable', 'Continuing, detections may not be saved')
+    else:
+        model = load_model()
+        if model is None:
+            return 1
+        
+        # Test Supabase connection
+        if config_ok:
+            connection_ok = test_supabase_connection()
+            if not connection_ok:
+                log.warning('supabase_unavailable', 'Detections may not be saved; fix the issues above')
+                response = input("\nContinue anyway? (y/n): ")
+                if response.lower() != 'y':
+                    return 1
+        
+        # Connect to camera
+        cap = open_camera()
+        if cap is None:
+            return 1
     
-    if not cap.isOpened():
-        print(f"❌ Error: Could not open camera {RTSP_URL}")
-        return
+    preview_channel = None
+    if PREVIEW_ENABLED:
+        try:
+            preview_channel = start_preview_server(PREVIEW_HOST, PREVIEW_PORT).channel(CAMERA_ID)
+        except OSError as e:
+            log.warning('preview_server_failed', str(e), port=PREVIEW_PORT)
     
-    print("✅ Camera connected!")
-    print(f"🔍 Starting detection (analyzing every {DETECTION_INTERVAL} second)...")
-    print("Press Ctrl+C to stop\n")
+    log.info('detection_started', interval_s=DETECTION_INTERVAL, spatial_mask=spatial_mask is not None)
     
     frame_count = 0
+    exit_code = 0
     last_call_time = {}  # Track last call time per zone to avoid spam
     
     try:
         while True:
             ret, frame = cap.read()
             if not ret:
-                print("⚠️ Failed to grab frame, retrying...")
+                log.frame('frame_grab_failed', 'retrying')
                 time.sleep(1)
                 continue
             
             frame_count += 1
             
-            # Run YOLO detection
-            results = model(frame, verbose=False)
+            # Run YOLO detection (on the ROI crop only, dropping boxes in excluded areas)
+            raster = spatial_mask.for_frame(frame) if spatial_mask else None
+            inference_frame = raster.crop_frame(frame) if raster else frame
+            results = model(inference_frame, verbose=False)
+            if raster:
+                results = raster.filter_results(results)
+            
+            if frame_count == 1:
+                log.info('first_detection', time_to_first_detection_s=round(time.perf_counter() - STARTUP_TIME, 3))
             
             # Analyze results
-            violations, has_violation = analyze_detection(results, model)
+            violations, has_violation, violation_labels = analyze_detection(results, model)
             
-            # Debug: Print detection status every 30 frames
-            if frame_count % 30 == 0:
-                detected_classes_list = []
+            # Detection status (sampled / rate-limited; only built when it will be logged)
+            if log.allow_frame('frame_status'):
+                detections = {}
                 if results[0].boxes is not None and len(results[0].boxes) > 0:
                     for box in results[0].boxes:
                         cls = int(box.cls[0])
                         conf = float(box.conf[0])
-                        if conf >= MIN_CONFIDENCE:
-                            detected_classes_list.append(f"{model.names[cls]}: {conf:.1%}")
-                print(f"📊 Frame {frame_count} - Detections: {detected_classes_list if detected_classes_list else 'None'}")
+                        name = model.names[cls]
+                        if conf >= MIN_CONFIDENCE and conf > detections.get(name, 0):
+                            detections[name] = round(conf, 3)
+                log.info('frame_status', frame=frame_count, detections=detections)
             
             # Only process if we have detections
             if len(violations) > 0:
@@ -503,22 +714,18 @@ def main():
                 
                 # Only push to Supabase and trigger alerts for actual violations
                 if has_violation:
-                    # Convert frame to base64
-                    img_b64 = frame_to_base64(frame)
+                    jpeg_bytes = frame_to_jpeg(frame)
                     severity = 'high'
                     
-                    print(f"\n🚨 VIOLATION DETECTED (Frame {frame_count}):")
-                    print(f"   Type: {violation_text}")
-                    print(f"   Severity: {severity}")
-                    print(f"   📤 Attempting to push to Supabase...")
+                    log.warning('violation_detected', frame=frame_count, violations=violations, severity=severity)
                     
-                    # Push to Supabase
-                    success = push_detection_to_supabase(img_b64, CAMERA_ID, violation_text, severity)
-                    
-                    if success:
-                        print(f"   ✅ Successfully pushed to Supabase!")
-                    else:
-                        print(f"   ❌ Failed to push to Supabase - check errors above")
+                    # Push via the site aggregator if configured, else (or if it fails) straight to Supabase.
+                    # Success/failure is logged by the push functions.
+                    pushed = False
+                    if INGEST_AGGREGATOR_URL:
+                        pushed = push_detection_to_aggregator(jpeg_bytes, violation_text, violation_labels, severity)
+                    if not pushed:
+                        push_detection_to_supabase(jpeg_to_base64(jpeg_bytes), CAMERA_ID, violation_text, severity)
                     
                     # Trigger alarm and call for high-severity violations
                     sound_alarm()
@@ -534,29 +741,31 @@ def main():
                             make_voice_call(message, supervisor_number)
                             last_call_time[CAMERA_ZONE] = current_time
                         else:
-                            print("⏸️ Phone call throttled (recent call made)")
+                            log.frame('call_throttled', supervisor=supervisor_number)
                 else:
                     # Just log monitoring status (no violation)
-                    print(f"✅ Monitoring (Frame {frame_count}): {violation_text}")
+                    log.frame('monitoring', violation_text, frame=frame_count)
             
-            # Optional: Display frame with detections (for debugging)
-            # annotated_frame = results[0].plot()
-            # cv2.imshow("Live Detection", annotated_frame)
-            # if cv2.waitKey(1) & 0xFF == ord('q'):
-            #     break
+            # Live preview: annotate + encode once per frame, only while someone is watching
+            if preview_channel is not None and preview_channel.has_viewers:
+                annotated_frame = annotate_frame(inference_frame, results, model.names, MIN_CONFIDENCE)
+                preview_jpeg = encode_jpeg(annotated_frame, PREVIEW_JPEG_QUALITY)
+                if preview_jpeg is not None:
+                    preview_channel.publish(preview_jpeg)
             
             # Wait before next detection
             time.sleep(DETECTION_INTERVAL)
     
     except KeyboardInterrupt:
-        print("\n\n⏹️ Stopping monitor...")
-    except Exception as e:
-        print(f"\n❌ Error in main loop: {e}")
+        log.info('monitor_stopping')
+    except Exception:
+        log.exception('main_loop_failed')
+        exit_code = 1
     finally:
         cap.release()
-        cv2.destroyAllWindows()
-        print("✅ Monitor stopped. Goodbye!")
+        log.info('monitor_stopped', frames=frame_count, exit_code=exit_code)
+    return exit_code
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main(headless=HEADLESS or '--headless' in sys.argv))
 
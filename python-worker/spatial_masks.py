@@ -0,0 +1,125 @@
+"""
+Per-camera spatial masks: a region of interest (ROI) and exclusion zones.
+Polygons are given in normalized (0-1) frame coordinates so one config works at any stream
+resolution. For each resolution the polygons are rasterized once into a lookup mask, and:
+  - before inference, the frame is cropped to the bounding rectangle of the allowed area
+    (fewer pixels to decode into the model input)
+  - after inference, boxes whose centre falls outside the allowed area are dropped with a
+    single array lookup instead of a point-in-polygon test per box
+"""
+
+from event_log import get_event_logger
+
+log = get_event_logger(component='spatial_mask')  # Callers pass their camera-bound logger instead
+
+VALIDATION_RESOLUTION = (640, 480)  # Nominal (width, height) the config is checked at on startup
+
+
+class RasterMask:
+    """Spatial mask rasterized for one frame resolution."""
+
+    def __init__(self, allowed, crop, log=log):
+        self.allowed = allowed  # uint8 (height, width); 1 where detections count
+        self.crop = crop  # (x1, y1, x2, y2) bounding rectangle of the allowed area
+        self.log = log
+
+    def crop_frame(self, frame):
+        """Return the part of the frame to run inference on (a view, no copy)."""
+        x1, y1, x2, y2 = self.crop
+        return frame[y1:y2, x1:x2]
+
+    def keep(self, xyxy):
+        """Boolean array: which boxes (in cropped-frame coordinates) have their centre in the allowed area."""
+        import numpy as np
+        height, width = self.allowed.shape
+        x1, y1 = self.crop[0], self.crop[1]
+        cx = ((xyxy[:, 0] + xyxy[:, 2]) / 2 + x1).astype(np.int32).clip(0, width - 1)
+        cy = ((xyxy[:, 1] + xyxy[:, 3]) / 2 + y1).astype(np.int32).clip(0, height - 1)
+        return self.allowed[cy, cx] > 0
+
+    def filter_results(self, results):
+        """Drop boxes outside the allowed area from YOLO results (returns results unchanged if none are)."""
+        boxes = results[0].boxes
+        if boxes is None or len(boxes) == 0:
+            return results
+        keep = self.keep(boxes.xyxy.cpu().numpy())
+        if keep.all():
+            return results
+        self.log.frame('boxes_masked', dropped=int((~keep).sum()), kept=int(keep.sum()))
+        return [results[0][keep.nonzero()[0].tolist()]]
+
+
+class SpatialMask:
+    """ROI and exclusion polygons for one camera, rasterized lazily per frame resolution."""
+
+    def __init__(self, roi=None, exclude=(), log=log):
+        self.roi = roi
+        self.exclude = list(exclude)
+        self.log = log
+        self._by_resolution = {}  # (width, height) -> RasterMask
+
+    def for_frame(self, frame):
+        height, width = frame.shape[:2]
+        raster = self._by_resolution.get((width, height))
+        if raster is None:
+            raster = self._by_resolution[(width, height)] = self._rasterize(width, height)
+        return raster
+
+    def _rasterize(self, width, height):
+        import cv2
+        import numpy as np
+
+        def to_pixels(polygon):
+            return np.round(np.asarray(polygon, dtype=np.float64) * [width, height]).astype(np.int32)
+
+        if self.roi:
+            allowed = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(allowed, [to_pixels(self.roi)], 1)
+        else:
+            allowed = np.ones((height, width), dtype=np.uint8)
+        if self.exclude:
+            cv2.fillPoly(allowed, [to_pixels(polygon) for polygon in self.exclude], 0)
+
+        ys, xs = np.nonzero(allowed)
+        if len(xs) == 0:
+            raise ValueError("Spatial mask excludes the whole frame - check the ROI/exclusion polygons")
+        crop = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        crop_pixels = (crop[2] - crop[0]) * (crop[3] - crop[1])
+        self.log.info('spatial_mask_built', resolution=f'{width}x{height}', crop=crop,
+                      inference_pixels=round(crop_pixels / (width * height), 3),
+                      allowed_pixels=round(len(xs) / (width * height), 3))
+        return RasterMask(allowed, crop, self.log)
+
+
+def validate_polygon(polygon, name):
+    """Raise ValueError unless the polygon has at least 3 (x, y) points, all within 0-1."""
+    if not isinstance(polygon, (list, tuple)):
+        raise ValueError(f"{name} must be a list of (x, y) points")
+    if len(polygon) < 3:
+        raise ValueError(f"{name} needs at least 3 points, got {len(polygon)}")
+    for point in polygon:
+        if (not isinstance(point, (list, tuple)) or len(point) != 2
+                or not all(isinstance(value, (int, float)) and 0 <= value <= 1 for value in point)):
+            raise ValueError(f"{name} point {point} is not an (x, y) pair within 0-1")
+
+
+def build_spatial_mask(config, log=log):
+    """Create a SpatialMask from a zone's {'roi': [...], 'exclude': [[...], ...]} config, or None if empty.
+    
+    Raises ValueError if the config is invalid or leaves no allowed area, so it fails at startup
+    instead of on the first frame. Mask events go to `log` (pass the camera-bound logger).
+    """
+    if config and not isinstance(config, dict):
+        raise ValueError("Spatial mask config must be a dict with 'roi' and/or 'exclude'")
+    if not config or not (config.get('roi') or config.get('exclude')):
+        return None
+    roi, exclude = config.get('roi'), config.get('exclude') or ()
+    if roi:
+        validate_polygon(roi, 'ROI')
+    if not isinstance(exclude, (list, tuple)):
+        raise ValueError("'exclude' must be a list of polygons")
+    for index, polygon in enumerate(exclude):
+        validate_polygon(polygon, f'Exclusion zone {index + 1}')
+    mask = SpatialMask(roi, exclude, log)
+    mask._rasterize(*VALIDATION_RESOLUTION)
+    return mask
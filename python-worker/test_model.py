@@ -1,6 +1,10 @@
 """
 Simple test script to verify your YOLO model (.pt file) works correctly.
 Run this to test your downloaded model before using it in the real-time system.
+
+To watch a camera the monitor is already using, don't run this (it would decode and run
+inference a second time) - start real_time_monitor.py with MONITOR_PREVIEW=1 and open
+http://127.0.0.1:8090/ instead (give each camera process on a host its own MONITOR_PREVIEW_PORT).
 """
 
 from ultralytics import YOLO